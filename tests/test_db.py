@@ -0,0 +1,248 @@
+"""
+Headless tests for the DB layer of tkinter_1: the shared connection, the
+db_signature-keyed fetch_table cache, import upsert, streamed reads and the
+settings flush. Run with: python -m unittest discover tests
+
+The module is imported from a copy in a temporary directory, because it
+creates its Data/ folder (DB, settings, logs, backups) next to its own file.
+"""
+import importlib.util
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import types
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+m = None
+_tmpdir = None
+
+
+def setUpModule():
+    global m, _tmpdir
+    _tmpdir = tempfile.mkdtemp(prefix="tkinter_1_tests_")
+    path = os.path.join(_tmpdir, "tkinter_1.py")
+    shutil.copy(os.path.join(ROOT, "tkinter_1.py"), path)
+    spec = importlib.util.spec_from_file_location("tkinter_1", path)
+    m = importlib.util.module_from_spec(spec)
+    sys.modules["tkinter_1"] = m
+    spec.loader.exec_module(m)
+    # no Excel mirror from the background worker while the tests write
+    m.config.mirror_excel = False
+
+
+def tearDownModule():
+    m.shutdown_io_worker()
+    with m._db_lock:
+        if m._CONN is not None:
+            m._CONN.close()
+            m._CONN = None
+    sys.modules.pop("tkinter_1", None)
+    shutil.rmtree(_tmpdir, ignore_errors=True)
+
+
+class DBTestCase(unittest.TestCase):
+    """Each test gets its own DB file with one standard table, 't'."""
+
+    def setUp(self):
+        m.DB_FILE = os.path.join(_tmpdir, self.id().rsplit(".", 1)[-1] + ".db")
+        m.invalidate_schema_cache()
+        m.criar_tabela_padrao("t")
+
+    def insert(self, idval, **values):
+        m.insert_row("t", dict(values, id=idval))
+
+
+class GetConnTests(DBTestCase):
+    def test_reuses_one_connection_per_file(self):
+        self.assertIs(m.get_conn(), m.get_conn())
+
+    def test_opens_in_wal_mode(self):
+        with m._db_lock:
+            mode = m.get_conn().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode.lower(), "wal")
+
+    def test_switching_file_closes_the_old_connection(self):
+        with m._db_lock:
+            old = m.get_conn()
+            other = m.get_conn(os.path.join(_tmpdir, "other.db"))
+            self.assertIsNot(old, other)
+            with self.assertRaises(sqlite3.ProgrammingError):
+                old.execute("SELECT 1")
+            # back to the test DB for the other helpers
+            m.get_conn()
+
+
+class FetchTableCacheTests(DBTestCase):
+    def test_update_cell_invalidates(self):
+        self.insert("1", empresa="A")
+        self.assertEqual(m.fetch_table("t")["empresa"].tolist(), ["A"])
+        m.update_cell("t", "empresa", "B", "1")
+        self.assertEqual(m.fetch_table("t")["empresa"].tolist(), ["B"])
+
+    def test_insert_row_invalidates(self):
+        self.insert("1")
+        self.assertEqual(len(m.fetch_table("t")), 1)
+        self.insert("2")
+        self.assertEqual(sorted(m.fetch_table("t")["id"]), ["1", "2"])
+
+    def test_delete_row_invalidates(self):
+        self.insert("1")
+        self.insert("2")
+        m.fetch_table("t")
+        m.delete_row("t", "1")
+        self.assertEqual(m.fetch_table("t")["id"].tolist(), ["2"])
+
+    def test_drop_table_invalidates(self):
+        self.insert("1")
+        self.assertEqual(len(m.fetch_table("t")), 1)
+        m.drop_table("t")
+        self.assertNotIn("t", m.listar_tabelas())
+        self.assertTrue(m.fetch_table("t").empty)
+
+    def test_write_from_another_connection_invalidates(self):
+        self.insert("1")
+        m.fetch_table("t")
+        con = sqlite3.connect(m.DB_FILE)
+        with con:
+            con.execute('INSERT INTO "t" (id) VALUES (?)', ("2",))
+        con.close()
+        self.assertEqual(sorted(m.fetch_table("t")["id"]), ["1", "2"])
+
+    def test_callers_get_their_own_copy(self):
+        self.insert("1", empresa="A")
+        df = m.fetch_table("t")
+        df.loc[0, "id"] = "changed"
+        self.assertEqual(m.fetch_table("t")["id"].tolist(), ["1"])
+
+    def test_ordered_and_company_filter(self):
+        self.insert("2", empresa="A")
+        self.insert("1", empresa="B")
+        self.insert("3", empresa="A")
+        df = m.fetch_table("t", columns=["id"], ordered=True, empresas=["A"])
+        self.assertEqual(df["id"].tolist(), ["2", "3"])
+
+    def test_missing_columns_keep_the_row_count(self):
+        self.insert("1")
+        self.insert("2")
+        df = m.fetch_table("t", columns=["nao_existe"])
+        self.assertEqual(len(df), 2)
+        self.assertEqual(list(df.columns), [])
+
+
+class ImportTests(DBTestCase):
+    def write_csv(self, text):
+        path = os.path.join(_tmpdir, self.id().rsplit(".", 1)[-1] + ".csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_inserts_new_and_updates_existing_ids(self):
+        self.insert("1", empresa="A", documento="old")
+        path = self.write_csv("id,empresa,documento\n1,A2,new\n2,B,x\n")
+        res = m.import_file_to_table(path, "t")
+        self.assertEqual(res, {"ok": True, "inserted": 1, "updated": 1})
+        df = m.fetch_table("t", ordered=True)
+        self.assertEqual(df["id"].tolist(), ["1", "2"])
+        self.assertEqual(df["empresa"].astype(str).tolist(), ["A2", "B"])
+        self.assertEqual(df["documento"].tolist(), ["new", "x"])
+
+    def test_id_repeated_in_the_file_is_inserted_then_updated(self):
+        path = self.write_csv("id,documento\n5,first\n5,second\n")
+        res = m.import_file_to_table(path, "t")
+        self.assertEqual(res, {"ok": True, "inserted": 1, "updated": 1})
+        self.assertEqual(m.fetch_table("t")["documento"].tolist(), ["second"])
+
+
+class IterTableRowsTests(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        with m._db_lock:
+            con = m.get_conn()
+            with con:
+                con.executemany('INSERT INTO "t" (id) VALUES (?)', [(str(i),) for i in range(2500)])
+
+    def test_yields_every_row(self):
+        ids = [row[0] for row in m.iter_table_rows("t", columns=["id"], batch_size=100)]
+        self.assertEqual(len(ids), 2500)
+
+    def test_writes_while_streaming_do_not_fail(self):
+        rows = m.iter_table_rows("t", columns=["id"], batch_size=100)
+        seen = [next(rows)]
+        # the reader must not hold a lock on the shared connection between batches
+        m.update_cell("t", "empresa", "X", "0")
+        self.insert("novo")
+        m.delete_row("t", "1")
+        seen += list(rows)
+        # the open read sees the snapshot it started on
+        self.assertEqual(len(seen), 2500)
+        self.assertEqual(len(m.fetch_table("t")), 2500)
+
+    def test_drop_table_while_streaming(self):
+        rows = m.iter_table_rows("t", batch_size=100)
+        next(rows)
+        m.drop_table("t")
+        self.assertNotIn("t", m.listar_tabelas())
+        rows.close()
+
+
+class ToNumericTests(DBTestCase):
+    def test_object_floats_and_none(self):
+        pd = m._get_pd()
+        s = pd.Series([1.5, None], dtype=object)
+        self.assertEqual(m.to_numeric(s).sum(), 1.5)
+
+    def test_object_ints(self):
+        pd = m._get_pd()
+        s = pd.Series([1, 2], dtype=object)
+        self.assertEqual(m.to_numeric(s).sum(), 3)
+
+    def test_decimal_comma_strings(self):
+        pd = m._get_pd()
+        s = pd.Series(["1,5", None, "x", "2"], dtype=object)
+        self.assertEqual(m.to_numeric(s).sum(), 3.5)
+
+    def test_concat_with_an_all_null_table(self):
+        pd = m._get_pd()
+        m.criar_tabela_padrao("u")
+        self.insert("1", valor_adquirido=10.5)
+        self.insert("2", valor_adquirido=2)
+        m.insert_row("u", {"id": "1"})
+        # same steps as update_table_display: column union, reindex, concat
+        dfs = [m.fetch_table(t, ordered=True) for t in ("t", "u")]
+        union = list(dict.fromkeys(c for df in dfs for c in df.columns))
+        concat_df = pd.concat([df.reindex(columns=union) for df in dfs], ignore_index=True)
+        concat_df["__tabela"] = ["t", "t", "u"]
+        self.assertEqual(m.to_numeric(concat_df["valor_adquirido"]).sum(), 12.5)
+
+        # the sheet footer and column sort go through to_numeric too
+        sheet = types.SimpleNamespace(df=concat_df, SUM_FIELDS=m.SheetFrame.SUM_FIELDS, sort_state={})
+        m.SheetFrame._compute_totals(sheet)
+        self.assertIn("Soma valor_adquirido: 12,50", m.SheetFrame._stats_text(sheet))
+        sheet._render_rows = lambda: None
+        m.SheetFrame.header_clicked(sheet, "valor_adquirido")
+        self.assertEqual(sheet.df["valor_adquirido"].tolist()[:2], [2.0, 10.5])
+
+
+class ConfigFlushTests(unittest.TestCase):
+    def test_flush_writes_pending_changes_once(self):
+        cfg = m.config
+        cfg.set_visual("t", ["id", "empresa"])
+        cfg.set_report(["valor_adquirido"])
+        self.assertTrue(cfg._dirty)
+        cfg.flush()
+        self.assertFalse(cfg._dirty)
+        with open(m.SETTINGS_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+        self.assertEqual(data["visual_cols"]["t"], ["id", "empresa"])
+        self.assertEqual(data["report_cols"], ["valor_adquirido"])
+        mtime = os.path.getmtime(m.SETTINGS_FILE)
+        cfg.flush()
+        self.assertEqual(os.path.getmtime(m.SETTINGS_FILE), mtime)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,28 +2,70 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 import tkinter.font as tkfont
 import sqlite3
-import pandas as pd
 import json
 import os
 from datetime import datetime
 import getpass
 import traceback
-import shutil
 import ast
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import matplotlib.pyplot as plt
 import threading
 import subprocess
 import sys
+import time
+import queue
+import functools
+import itertools
+import importlib.util
 
-# optional interactivity
+# optional streaming xlsx engine (falls back to openpyxl write-only); only
+# looked up here, the import itself happens on the first xlsx write
+XLSXWRITER_AVAILABLE = importlib.util.find_spec("xlsxwriter") is not None
+
+# optional fast JSON serializer for exports
 try:
-    import mplcursors
-    MPLCURSORS_AVAILABLE = True
+    import orjson
+    ORJSON_AVAILABLE = True
 except Exception:
-    MPLCURSORS_AVAILABLE = False
+    ORJSON_AVAILABLE = False
+
+# ---------------------------
+# Imports pesados sob demanda (pandas / matplotlib)
+# ---------------------------
+_pd = None
+
+def _get_pd():
+    """Imports pandas on first use, keeping it off the startup path."""
+    global _pd
+    if _pd is None:
+        import pandas
+        _pd = pandas
+    return _pd
+
+plt = None
+FigureCanvasTkAgg = None
+NavigationToolbar2Tk = None
+mplcursors = None
+MPLCURSORS_AVAILABLE = False
+
+def _load_matplotlib():
+    """Imports matplotlib (Tk backend) and the optional mplcursors the first time a graph is drawn."""
+    global plt, FigureCanvasTkAgg, NavigationToolbar2Tk, mplcursors, MPLCURSORS_AVAILABLE
+    if plt is not None:
+        return
+    import matplotlib
+    matplotlib.use("TkAgg")
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg as _canvas, NavigationToolbar2Tk as _toolbar
+    import matplotlib.pyplot as _plt
+    FigureCanvasTkAgg = _canvas
+    NavigationToolbar2Tk = _toolbar
+    # optional interactivity
+    try:
+        import mplcursors as _mplcursors
+        mplcursors = _mplcursors
+        MPLCURSORS_AVAILABLE = True
+    except Exception:
+        MPLCURSORS_AVAILABLE = False
+    plt = _plt
 
 # ---------------------------
 # Constantes / diretórios
@@ -39,6 +81,8 @@ EXPORT_DIR = os.path.join(DATA_DIR, "exportacoes")
 BACKUP_DIR = os.path.join(DATA_DIR, "Backups")
 LOGS_DIR = os.path.join(DATA_DIR, "logs")
 
+SETTINGS_SAVE_DELAY = 0.5
+
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(EXPORT_DIR, exist_ok=True)
 os.makedirs(BACKUP_DIR, exist_ok=True)
@@ -59,7 +103,12 @@ class Config:
         self.col_types = {}
         # col_standardization: {table_or_*: {col: {"mode":"free"|"fixed", "values": [], "required": False}}}
         self.col_standardization = {}
+        # resolved get_col_standardization results, keyed by (table, col)
+        self._std_cache = {}
         self.db_path = ""
+        self.mirror_excel = True
+        self._lock = threading.RLock()
+        self._dirty = False
         self.load()
 
     def get_visual(self, table, allcols):
@@ -69,14 +118,16 @@ class Config:
         return v if v is not None else allcols
 
     def set_visual(self, table, cols):
-        self.visual_cols[table] = cols
+        with self._lock:
+            self.visual_cols[table] = cols
         self.save()
 
     def get_report(self, allcols):
         return self.report_cols if self.report_cols else allcols
 
     def set_report(self, cols):
-        self.report_cols = cols
+        with self._lock:
+            self.report_cols = cols
         self.save()
 
     def get_col_type(self, table, col):
@@ -87,12 +138,21 @@ class Config:
         return "text"
 
     def set_col_type(self, table, col, type_str):
-        if table not in self.col_types:
-            self.col_types[table] = {}
-        self.col_types[table][col] = type_str
+        with self._lock:
+            if table not in self.col_types:
+                self.col_types[table] = {}
+            self.col_types[table][col] = type_str
         self.save()
 
     def get_col_standardization(self, table, col):
+        # the result is shared between callers: read it, don't modify it
+        key = (table, col)
+        std = self._std_cache.get(key)
+        if std is None:
+            std = self._std_cache[key] = self._resolve_col_standardization(table, col)
+        return std
+
+    def _resolve_col_standardization(self, table, col):
         # precedence: specific table, then "*"
         if table in self.col_standardization and col in self.col_standardization[table]:
             std = self.col_standardization[table][col]
@@ -103,25 +163,64 @@ class Config:
         return {"mode": "free", "values": [], "required": False}
 
     def set_col_standardization(self, table, col, mode, values, required=False):
-        if table not in self.col_standardization:
-            self.col_standardization[table] = {}
-        self.col_standardization[table][col] = {"mode": mode, "values": list(values), "required": bool(required)}
+        with self._lock:
+            if table not in self.col_standardization:
+                self.col_standardization[table] = {}
+            self.col_standardization[table][col] = {"mode": mode, "values": list(values), "required": bool(required)}
+            self._std_cache.clear()
         self.save()
 
     def set_db_path(self, path):
-        self.db_path = path
+        with self._lock:
+            self.db_path = path
+        self.save()
+
+    def set_mirror_excel(self, enabled):
+        with self._lock:
+            self.mirror_excel = bool(enabled)
+        self.save()
+
+    def forget_table(self, table):
+        # drop every per-table setting of a removed table
+        with self._lock:
+            self.visual_cols.pop(table, None)
+            self.col_types.pop(table, None)
+            self.col_standardization.pop(table, None)
+            self._std_cache.clear()
         self.save()
 
     def save(self):
+        """
+        Marks the settings as dirty and schedules a flush on the I/O worker
+        after SETTINGS_SAVE_DELAY, so a burst of set_* calls is written once.
+        """
+        with self._lock:
+            if self._dirty:
+                return
+            self._dirty = True
+        timer = threading.Timer(SETTINGS_SAVE_DELAY, run_in_io_worker, (self.flush,))
+        timer.daemon = True
+        timer.start()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = json.dumps({
+                "visual_cols": self.visual_cols,
+                "report_cols": self.report_cols,
+                "col_types": self.col_types,
+                "col_standardization": self.col_standardization,
+                "db_path": self.db_path,
+                "mirror_excel": self.mirror_excel
+            }, ensure_ascii=False, indent=2)
         try:
-            with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                json.dump({
-                    "visual_cols": self.visual_cols,
-                    "report_cols": self.report_cols,
-                    "col_types": self.col_types,
-                    "col_standardization": self.col_standardization,
-                    "db_path": self.db_path
-                }, f, ensure_ascii=False, indent=2)
+            # write to a temp file first so a crash never leaves a truncated settings.json
+            tmp = SETTINGS_FILE + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, SETTINGS_FILE)
         except Exception as e:
             print("Erro ao salvar settings:", e)
 
@@ -134,7 +233,9 @@ class Config:
                     self.report_cols = data.get("report_cols", [])
                     self.col_types = data.get("col_types", {})
                     self.col_standardization = data.get("col_standardization", {})
+                    self._std_cache.clear()
                     self.db_path = data.get("db_path", "")
+                    self.mirror_excel = data.get("mirror_excel", True)
             except Exception as e:
                 print("Erro ao carregar settings:", e)
 
@@ -148,8 +249,52 @@ DB_FILE = config.db_path if config.db_path else DEFAULT_DB
 # ---------------------------
 # Helpers DB / FS / logs / backup
 # ---------------------------
-def get_conn():
-    return sqlite3.connect(DB_FILE)
+_CONN = None
+_CONN_PATH = None
+_db_lock = threading.RLock()
+
+def get_conn(path=None):
+    """
+    Returns the shared connection to path (default DB_FILE), opening it on
+    first use; a connection to a different file is closed first. Callers
+    must hold _db_lock while using it.
+    """
+    global _CONN, _CONN_PATH
+    with _db_lock:
+        if path is None:
+            path = DB_FILE
+        if _CONN is not None and _CONN_PATH == path:
+            return _CONN
+        if _CONN is not None:
+            try:
+                _CONN.close()
+            except Exception:
+                pass
+            _CONN = None
+        con = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA temp_store=MEMORY")
+            con.execute("PRAGMA cache_size=-65536")
+        except Exception:
+            con.close()
+            raise
+        _CONN = con
+        _CONN_PATH = path
+        return _CONN
+
+def db_signature():
+    """
+    Cheap fingerprint of the DB contents: data_version moves on commits from
+    other connections, total_changes on our own row writes and schema_version
+    on DDL (create/drop table).
+    """
+    with _db_lock:
+        con = get_conn()
+        data_version = con.execute("PRAGMA data_version").fetchone()[0]
+        schema_version = con.execute("PRAGMA schema_version").fetchone()[0]
+        return (DB_FILE, data_version, schema_version, con.total_changes)
 
 def ensure_dirs_for_backup_and_logs():
     os.makedirs(BACKUP_DIR, exist_ok=True)
@@ -165,13 +310,46 @@ def copy_db_backup():
         filename = f"backup dp {tsfile}.db"
         dst = os.path.join(folder, filename)
         if os.path.isfile(DB_FILE):
-            shutil.copy2(DB_FILE, dst)
+            # sqlite's online backup under the lock: a consistent snapshot of the
+            # DB (WAL contents included), never a file copy torn by a commit
+            dest = sqlite3.connect(dst)
+            try:
+                with _db_lock:
+                    get_conn().backup(dest)
+            except Exception:
+                dest.close()
+                os.remove(dst)
+                raise
+            dest.close()
             return dst
     except Exception:
         print("Erro ao copiar backup do DB:", traceback.format_exc())
     return None
 
+BACKUP_EVERY_EDITS = 50
+BACKUP_EVERY_SECONDS = 60
+_edit_counter = 0
+_last_backup_ts = time.monotonic()
+
+def maybe_copy_db_backup():
+    """
+    Counts one edit and queues a DB backup on the I/O worker once
+    BACKUP_EVERY_EDITS edits or BACKUP_EVERY_SECONDS have passed since the
+    last one, instead of copying the file on every write.
+    """
+    global _edit_counter, _last_backup_ts
+    _edit_counter += 1
+    now = time.monotonic()
+    if _edit_counter >= BACKUP_EVERY_EDITS or now - _last_backup_ts >= BACKUP_EVERY_SECONDS:
+        _edit_counter = 0
+        _last_backup_ts = now
+        run_in_io_worker(copy_db_backup)
+
 def write_log_file(payload):
+    """Queues the audit log entry; the file is written by the I/O worker."""
+    run_in_io_worker(_write_log_file, payload)
+
+def _write_log_file(payload):
     try:
         ensure_dirs_for_backup_and_logs()
         date_folder = datetime.now().strftime("%Y-%m-%d")
@@ -187,38 +365,126 @@ def write_log_file(payload):
         print("Erro ao gravar log:", traceback.format_exc())
         return None
 
+class XlsxStreamWriter:
+    """
+    Row-streaming xlsx writer. Uses xlsxwriter in constant_memory mode when
+    available, otherwise an openpyxl write-only workbook; either way rows are
+    flushed as they are appended instead of being kept as cell objects.
+    """
+    def __init__(self, path):
+        self.path = path
+        if XLSXWRITER_AVAILABLE:
+            import xlsxwriter
+            self.book = xlsxwriter.Workbook(path, {
+                "constant_memory": True,
+                "strings_to_formulas": False,
+                "strings_to_urls": False,
+            })
+        else:
+            from openpyxl import Workbook
+            self.book = Workbook(write_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def add_sheet(self, name, header=None):
+        """Creates a sheet and returns an append(row) function for it."""
+        if XLSXWRITER_AVAILABLE:
+            ws = self.book.add_worksheet(name)
+            next_row = [0]
+            def append(row):
+                ws.write_row(next_row[0], 0, [_xlsx_value(v) for v in row])
+                next_row[0] += 1
+        else:
+            ws = self.book.create_sheet(title=name)
+            def append(row):
+                ws.append([_xlsx_value(v) for v in row])
+        if header:
+            append(header)
+        return append
+
+    def write_dataframe(self, name, df):
+        append = self.add_sheet(name, list(df.columns))
+        for row in df.itertuples(index=False, name=None):
+            append(row)
+
+    def close(self):
+        if XLSXWRITER_AVAILABLE:
+            self.book.close()
+        else:
+            self.book.save(self.path)
+
+def _xlsx_value(v):
+    # NaN (missing value coming from pandas) is written as an empty cell
+    if isinstance(v, float) and v != v:
+        return None
+    return v
+
+def _write_geral_sheet(writer, tables):
+    """
+    Streams every table into a 'geral' sheet, tagged with __tabela_origem.
+    The header is the union of the table columns, so rows are appended table
+    by table without building a combined DataFrame.
+    """
+    table_cols = {t: get_table_columns(t) for t in tables}
+    union = list(dict.fromkeys(c for t in tables for c in table_cols[t]))
+    append = writer.add_sheet("geral", union + ["__tabela_origem"] if union else None)
+    for t in tables:
+        col_idx = {c: i for i, c in enumerate(table_cols[t])}
+        pos = [col_idx.get(c) for c in union]
+        try:
+            for row in iter_table_rows(t):
+                append([row[p] if p is not None else None for p in pos] + [t])
+        except Exception:
+            # ignora erro de tabela individual
+            continue
+
+# db_signature() of the last successful mirror, per output file
+_mirror_signatures = {}
+
+def _mirror_is_current(outpath):
+    """Returns (current, signature); current is True when outpath already reflects the DB."""
+    try:
+        sig = db_signature()
+    except Exception:
+        return False, None
+    return _mirror_signatures.get(outpath) == sig and os.path.isfile(outpath), sig
+
 def mirror_db_to_excel():
     """
     Exports each table to its own sheet and also a 'geral' sheet with all rows combined.
+    Skipped when nothing changed since the last mirror.
     """
     try:
         os.makedirs(EXPORT_DIR, exist_ok=True)
-        tables = listar_tabelas()
         outpath = os.path.join(EXPORT_DIR, "db_excel.xlsx")
-        with pd.ExcelWriter(outpath) as writer:
-            all_dfs = []
+        current, sig = _mirror_is_current(outpath)
+        if current:
+            return
+        tables = listar_tabelas()
+        with XlsxStreamWriter(outpath) as writer:
             for t in tables:
                 try:
-                    df = fetch_table(t)
                     # write table sheet
                     sheet_name = t[:31] if t else "sheet"
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-                    if not df.empty:
-                        # add column indicating origem table to geral
-                        dft = df.copy()
-                        dft["__tabela_origem"] = t
-                        all_dfs.append(dft)
+                    append = writer.add_sheet(sheet_name, get_table_columns(t))
+                    for row in iter_table_rows(t):
+                        append(row)
                 except Exception:
-                    pd.DataFrame({"error": [f"falha ao exportar tabela {t}"]}).to_excel(writer, sheet_name=(t[:31] if t else "sheet"), index=False)
+                    try:
+                        writer.add_sheet(t[:31] if t else "sheet", ["error"])([f"falha ao exportar tabela {t}"])
+                    except Exception:
+                        pass
             # write geral sheet
-            if all_dfs:
-                geral = pd.concat(all_dfs, ignore_index=True)
-            else:
-                geral = pd.DataFrame()
             try:
-                geral.to_excel(writer, sheet_name="geral", index=False)
+                _write_geral_sheet(writer, tables)
             except Exception:
                 pass
+        _mirror_signatures[outpath] = sig
     except Exception:
         print("Erro ao gerar mirror excel:", traceback.format_exc())
 
@@ -230,191 +496,354 @@ def mirror_db_to_excel_only_geral():
     try:
         os.makedirs(DATA_DIR, exist_ok=True)
 
-        tables = listar_tabelas()
         outpath = os.path.join(DATA_DIR, "db_excel.xlsx")
+        current, sig = _mirror_is_current(outpath)
+        if current:
+            return
+        tables = listar_tabelas()
 
-        all_dfs = []
+        with XlsxStreamWriter(outpath) as writer:
+            _write_geral_sheet(writer, tables)
+        _mirror_signatures[outpath] = sig
 
-        for t in tables:
-            try:
-                df = fetch_table(t)
-                if not df.empty:
-                    dft = df.copy()
-                    dft["__tabela_origem"] = t
-                    all_dfs.append(dft)
-            except Exception:
-                # ignora erro de tabela individual
-                continue
+    except Exception:
+        print("Erro ao gerar mirror excel:", traceback.format_exc())
 
-        if all_dfs:
-            geral = pd.concat(all_dfs, ignore_index=True)
-        else:
-            geral = pd.DataFrame()
 
-        with pd.ExcelWriter(outpath) as writer:
-            geral.to_excel(writer, sheet_name="geral", index=False)
+# ---------------------------
+# Worker de I/O: logs e mirror Excel fora da thread da UI
+# ---------------------------
+MIRROR_DEBOUNCE_SECONDS = 5
+_io_queue = queue.Queue()
+
+def run_in_io_worker(func, *args):
+    """Queues func(*args) to run on the I/O worker thread."""
+    _io_queue.put((func, args))
 
+def schedule_mirror():
+    """
+    Marks the Excel mirror as stale. The I/O worker rewrites it once no new
+    request arrived for MIRROR_DEBOUNCE_SECONDS, so a burst of edits costs a
+    single export.
+    """
+    if config.mirror_excel:
+        _io_queue.put((mirror_db_to_excel, ()))
+
+def _run_io_job(func, args):
+    try:
+        func(*args)
     except Exception:
-        print("Erro ao gerar mirror excel:", traceback.format_exc())
+        print("Erro no worker de I/O:", traceback.format_exc())
 
+def _drain():
+    mirror_due = None
+    while True:
+        timeout = None if mirror_due is None else max(0, mirror_due - time.monotonic())
+        try:
+            job = _io_queue.get(timeout=timeout)
+        except queue.Empty:
+            mirror_due = None
+            _run_io_job(mirror_db_to_excel, ())
+            continue
+        if job is None:
+            # shutdown: write a pending mirror right away
+            if mirror_due is not None:
+                _run_io_job(mirror_db_to_excel, ())
+            return
+        func, args = job
+        if func is mirror_db_to_excel:
+            mirror_due = time.monotonic() + MIRROR_DEBOUNCE_SECONDS
+        else:
+            _run_io_job(func, args)
+
+_io_worker = threading.Thread(target=_drain, daemon=True)
+_io_worker.start()
+
+def shutdown_io_worker():
+    """Runs the queued I/O (and a pending mirror) and stops the worker."""
+    _io_queue.put(None)
+    _io_worker.join()
+    config.flush()
 
 # ---------------------------
 # DB helpers
 # ---------------------------
+# schema lookups are cached per DB file; invalidate_schema_cache() must be
+# called after anything that creates/drops tables or changes columns
+@functools.lru_cache(maxsize=1)
+def _tables_cached(dbfile):
+    with _db_lock:
+        cur = get_conn().cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        return tuple(row[0] for row in cur.fetchall())
+
+@functools.lru_cache(maxsize=256)
+def _columns_cached(dbfile, tablename):
+    with _db_lock:
+        cur = get_conn().cursor()
+        cur.execute(f"PRAGMA table_info(\"{tablename}\")")
+        return tuple(row[1] for row in cur.fetchall())
+
+def invalidate_schema_cache():
+    _tables_cached.cache_clear()
+    _columns_cached.cache_clear()
+    table_sql.cache_clear()
+    _fetch_table_cached.cache_clear()
+
 def listar_tabelas():
     try:
-        con = get_conn()
+        return list(_tables_cached(DB_FILE))
     except Exception:
         return []
-    cur = con.cursor()
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-    tabelas = [row[0] for row in cur.fetchall()]
-    con.close()
-    return tabelas
 
 def get_table_columns(tablename):
     try:
-        con = get_conn()
+        return list(_columns_cached(DB_FILE, tablename))
     except Exception:
         return []
-    cur = con.cursor()
-    cur.execute(f"PRAGMA table_info(\"{tablename}\")")
-    columns = [row[1] for row in cur.fetchall()]
-    con.close()
-    return columns
 
-def fetch_table(tablename):
-    try:
-        con = get_conn()
-        df = pd.read_sql(f"SELECT * FROM \"{tablename}\"", con)
-        con.close()
-        return df
-    except Exception:
-        return pd.DataFrame()
+# keyed by db_signature(), so any committed change makes old entries unreachable
+@functools.lru_cache(maxsize=32)
+def _fetch_table_cached(tablename, columns, ordered, empresas, signature):
+    pd = _get_pd()
+    existing = get_table_columns(tablename)
+    where = ""
+    params = ()
+    if empresas is not None and "empresa" in existing:
+        where = f" WHERE empresa IN ({', '.join('?' * len(empresas))})"
+        params = empresas
+    if columns is None:
+        colsql = "*"
+    else:
+        wanted = [c for c in columns if c in existing]
+        if not wanted:
+            # none of the columns exist here: still return one (column-less) row
+            # per table row, so callers can tell an empty table from a narrow read
+            with _db_lock:
+                try:
+                    n = get_conn().execute(f"SELECT COUNT(*) FROM \"{tablename}\"{where}", params).fetchone()[0]
+                except Exception:
+                    return pd.DataFrame()
+            return pd.DataFrame(index=pd.RangeIndex(n))
+        colsql = ", ".join([f'"{c}"' for c in wanted])
+    # NULL ids last, like sort_values
+    order = " ORDER BY id IS NULL, id" if ordered and "id" in existing else ""
+    with _db_lock:
+        try:
+            df = pd.read_sql_query(f"SELECT {colsql} FROM \"{tablename}\"{where}{order}", get_conn(), params=params)
+        except Exception:
+            return pd.DataFrame()
+    if "empresa" in df.columns:
+        # few distinct companies: integer codes make isin/groupby cheap for every cached copy
+        df["empresa"] = df["empresa"].astype("category")
+    return df
 
-def table_has_id(tablename, idval):
+def fetch_table(tablename, columns=None, ordered=False, empresas=None):
+    """
+    Reads a table into a DataFrame. When columns is given only those columns
+    (the ones that exist in the table) are read; ordered=True sorts the rows
+    by id and empresas keeps only rows of those companies, both in SQL.
+    Results are cached until the DB changes; callers get their own copy.
+    """
+    with _db_lock:
+        try:
+            sig = db_signature()
+        except Exception:
+            sig = None
+        key = None if columns is None else tuple(columns)
+        emp_key = None if empresas is None else tuple(sorted(empresas))
+        if sig is None:
+            return _fetch_table_cached.__wrapped__(tablename, key, ordered, emp_key, sig)
+        return _fetch_table_cached(tablename, key, ordered, emp_key, sig).copy()
+
+def quote_ident(name):
+    """Quotes an SQLite identifier (table or column name)."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+@functools.lru_cache(maxsize=128)
+def table_sql(tablename, op, col=None):
+    """
+    SQL for the id-based row helpers, built and validated once per
+    (table, op, column). Reusing the same text lets sqlite3's statement
+    cache skip re-preparing it.
+    """
+    if tablename not in listar_tabelas():
+        raise ValueError(f"Tabela inexistente: {tablename}")
+    if col is not None and col not in get_table_columns(tablename):
+        raise ValueError(f"Coluna inexistente: {col}")
+    t = quote_ident(tablename)
+    if op == "has_id":
+        return f"SELECT COUNT(1) FROM {t} WHERE id=?"
+    if op == "select_row":
+        return f"SELECT * FROM {t} WHERE id=?"
+    if op == "delete_row":
+        return f"DELETE FROM {t} WHERE id=?"
+    if op == "select_cell":
+        return f"SELECT {quote_ident(col)} FROM {t} WHERE id=?"
+    if op == "update_cell":
+        return f"UPDATE {t} SET {quote_ident(col)}=? WHERE id=?"
+    raise ValueError(f"Operação desconhecida: {op}")
+
+def listar_empresas(tables):
+    """Distinct non-null 'empresa' values of the given tables, in a single UNION query."""
+    selects = [f"SELECT empresa FROM \"{t}\"" for t in tables if "empresa" in get_table_columns(t)]
+    if not selects:
+        return set()
+    with _db_lock:
+        try:
+            cur = get_conn().cursor()
+            cur.execute(" UNION ".join(selects))
+            return {str(row[0]) for row in cur.fetchall() if row[0] is not None}
+        except Exception:
+            return set()
+
+def iter_table_rows(tablename, columns=None, batch_size=1000):
+    """
+    Yields the rows of a table as plain tuples, read in batches of batch_size
+    without building a DataFrame. The read uses its own query-only connection
+    instead of the shared one: an open cursor on the shared connection would
+    make a DROP TABLE from the UI fail with "database table is locked", while
+    in WAL mode a second connection reads a snapshot and never blocks writers.
+    """
+    colsql = "*" if columns is None else ", ".join([quote_ident(c) for c in columns])
+    con = sqlite3.connect(DB_FILE, check_same_thread=False)
     try:
-        con = get_conn()
+        con.execute("PRAGMA query_only=ON")
         cur = con.cursor()
-        cur.execute(f"SELECT COUNT(1) FROM \"{tablename}\" WHERE id=?", (idval,))
-        res = cur.fetchone()[0]
+        cur.arraysize = batch_size
+        cur.execute(f"SELECT {colsql} FROM {quote_ident(tablename)}")
+        while True:
+            rows = cur.fetchmany()
+            if not rows:
+                break
+            yield from rows
+    finally:
         con.close()
-        return res > 0
-    except Exception:
-        return False
+
+def table_has_id(tablename, idval):
+    with _db_lock:
+        try:
+            cur = get_conn().cursor()
+            cur.execute(table_sql(tablename, "has_id"), (idval,))
+            return cur.fetchone()[0] > 0
+        except Exception:
+            return False
 
 def update_cell(tablename, col, val, rowid):
-    con = get_conn()
-    cur = con.cursor()
-    try:
-        cur.execute(f"SELECT {col} FROM \"{tablename}\" WHERE id=?", (rowid,))
-        old = cur.fetchone()
-        oldval = old[0] if old is not None else None
-        cur.execute(f"UPDATE \"{tablename}\" SET {col}=? WHERE id=?", (val, rowid))
-        con.commit()
-        payload = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "tabela": tablename,
-            "rowid": str(rowid),
-            "coluna": col,
-            "valor_antigo": None if oldval is None else str(oldval),
-            "valor_novo": None if val is None else str(val),
-            "usuario": CURRENT_USER,
-            "acao": "UPDATE"
-        }
-        write_log_file(payload)
-        #copy_db_backup()
-        mirror_db_to_excel()
-    finally:
-        con.close()
+    with _db_lock:
+        con = get_conn()
+        with con:
+            cur = con.cursor()
+            cur.execute(table_sql(tablename, "select_cell", col), (rowid,))
+            old = cur.fetchone()
+            oldval = old[0] if old is not None else None
+            cur.execute(table_sql(tablename, "update_cell", col), (val, rowid))
+    payload = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "tabela": tablename,
+        "rowid": str(rowid),
+        "coluna": col,
+        "valor_antigo": None if oldval is None else str(oldval),
+        "valor_novo": None if val is None else str(val),
+        "usuario": CURRENT_USER,
+        "acao": "UPDATE"
+    }
+    write_log_file(payload)
+    maybe_copy_db_backup()
+    schedule_mirror()
 
 def insert_row(tablename, values_dict):
-    con = get_conn()
-    cur = con.cursor()
-    try:
-        idval = values_dict.get("id")
-        if idval:
-            cur.execute(f"SELECT COUNT(1) FROM \"{tablename}\" WHERE id=?", (idval,))
-            if cur.fetchone()[0] > 0:
-                raise ValueError(f"Já existe um registro com id={idval} na tabela {tablename}.")
-        cols = list(values_dict.keys())
-        vals = [values_dict[c] for c in cols]
-        placeholders = ", ".join(["?" for _ in cols])
-        colstr = ", ".join([f'"{c}"' for c in cols])
-        cur.execute(f"INSERT INTO \"{tablename}\" ({colstr}) VALUES ({placeholders})", vals)
-        con.commit()
-        payload = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "tabela": tablename,
-            "rowid": str(idval),
-            "acao": "INSERT",
-            "detalhes": values_dict,
-            "usuario": CURRENT_USER
-        }
-        write_log_file(payload)
-        #copy_db_backup()
-        mirror_db_to_excel()
-        return idval
-    finally:
-        con.close()
+    idval = values_dict.get("id")
+    with _db_lock:
+        con = get_conn()
+        with con:
+            cur = con.cursor()
+            if idval:
+                cur.execute(table_sql(tablename, "has_id"), (idval,))
+                if cur.fetchone()[0] > 0:
+                    raise ValueError(f"Já existe um registro com id={idval} na tabela {tablename}.")
+            cols = list(values_dict.keys())
+            vals = [values_dict[c] for c in cols]
+            placeholders = ", ".join(["?" for _ in cols])
+            colstr = ", ".join([f'"{c}"' for c in cols])
+            cur.execute(f"INSERT INTO \"{tablename}\" ({colstr}) VALUES ({placeholders})", vals)
+    payload = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "tabela": tablename,
+        "rowid": str(idval),
+        "acao": "INSERT",
+        "detalhes": values_dict,
+        "usuario": CURRENT_USER
+    }
+    write_log_file(payload)
+    maybe_copy_db_backup()
+    schedule_mirror()
+    return idval
 
 def delete_row(tablename, rowid):
-    con = get_conn()
-    cur = con.cursor()
     try:
-        try:
-            rowid_int = int(rowid)
-        except Exception:
-            rowid_int = rowid
-        cur.execute(f"SELECT * FROM \"{tablename}\" WHERE id=?", (rowid_int,))
-        result = cur.fetchone()
-        if result:
-            cols = get_table_columns(tablename)
-            rowdict = {cols[idx]: result[idx] for idx in range(len(cols))}
-            payload = {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "tabela": tablename,
-                "rowid": str(rowid_int),
-                "acao": "DELETE",
-                "valor_antigo": rowdict,
-                "usuario": CURRENT_USER
-            }
-            write_log_file(payload)
-        cur.execute(f"DELETE FROM \"{tablename}\" WHERE id=?", (rowid_int,))
-        con.commit()
-        #copy_db_backup()
-        mirror_db_to_excel()
-    finally:
-        con.close()
+        rowid_int = int(rowid)
+    except Exception:
+        rowid_int = rowid
+    with _db_lock:
+        con = get_conn()
+        with con:
+            cur = con.cursor()
+            cur.execute(table_sql(tablename, "select_row"), (rowid_int,))
+            result = cur.fetchone()
+            if result:
+                cols = [d[0] for d in cur.description]
+                rowdict = {cols[idx]: result[idx] for idx in range(len(cols))}
+                payload = {
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "tabela": tablename,
+                    "rowid": str(rowid_int),
+                    "acao": "DELETE",
+                    "valor_antigo": rowdict,
+                    "usuario": CURRENT_USER
+                }
+                write_log_file(payload)
+            cur.execute(table_sql(tablename, "delete_row"), (rowid_int,))
+    maybe_copy_db_backup()
+    schedule_mirror()
 
 def drop_table(tablename):
-    con = get_conn()
-    cur = con.cursor()
-    try:
-        cur.execute(f"DROP TABLE IF EXISTS \"{tablename}\"")
-        con.commit()
-        if tablename in config.visual_cols:
-            del config.visual_cols[tablename]
-        if tablename in config.col_types:
-            del config.col_types[tablename]
-        if tablename in config.col_standardization:
-            del config.col_standardization[tablename]
-        config.save()
-        payload = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "tabela": tablename,
-            "acao": "DROP_TABLE",
-            "usuario": CURRENT_USER
-        }
-        write_log_file(payload)
-        #copy_db_backup()
-        mirror_db_to_excel()
-    finally:
-        con.close()
+    with _db_lock:
+        con = get_conn()
+        with con:
+            cur = con.cursor()
+            cur.execute(f"DROP TABLE IF EXISTS \"{tablename}\"")
+            invalidate_schema_cache()
+    config.forget_table(tablename)
+    payload = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "tabela": tablename,
+        "acao": "DROP_TABLE",
+        "usuario": CURRENT_USER
+    }
+    write_log_file(payload)
+    maybe_copy_db_backup()
+    schedule_mirror()
+
+def ensure_id_index(cur, tablename):
+    """
+    Creates an index on the id column (unless id is already the primary key),
+    so the WHERE id=? lookups do not scan the whole table.
+    """
+    info = cur.execute(f"PRAGMA table_info({quote_ident(tablename)})").fetchall()
+    if any(row[1] == "id" and row[5] for row in info):
+        return
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {quote_ident('idx_' + tablename + '_id')} ON {quote_ident(tablename)}(id)")
+
+def analyze_db():
+    """Refreshes the query planner statistics."""
+    with _db_lock:
+        try:
+            get_conn().execute("ANALYZE")
+        except Exception:
+            print("Erro ao executar ANALYZE:", traceback.format_exc())
 
 def criar_tabela_padrao(nome):
-    con = get_conn()
-    cur = con.cursor()
     sql = f"""CREATE TABLE IF NOT EXISTS "{nome}" (
         id TEXT PRIMARY KEY,
         documento TEXT,
@@ -433,9 +862,11 @@ def criar_tabela_padrao(nome):
         saldo_devedor_com_juros REAL,
         tuplas TEXT
     )"""
-    cur.execute(sql)
-    con.commit()
-    con.close()
+    with _db_lock:
+        con = get_conn()
+        with con:
+            con.execute(sql)
+        invalidate_schema_cache()
 
 # ---------------------------
 # Import / Export
@@ -443,6 +874,22 @@ def criar_tabela_padrao(nome):
 def ensure_export_dir():
     os.makedirs(EXPORT_DIR, exist_ok=True)
 
+def _write_csv(df, path):
+    # always pandas' writer, so the file format never depends on which optional
+    # packages are installed; large chunks keep the number of write passes low
+    df.to_csv(path, index=False, encoding="utf-8", chunksize=100_000)
+
+def _write_json(df, path):
+    if ORJSON_AVAILABLE:
+        try:
+            data = orjson.dumps(df.to_dict(orient="records"), option=orjson.OPT_SERIALIZE_NUMPY)
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+        except TypeError:
+            pass
+    df.to_json(path, orient="records", force_ascii=False, date_unit="s")
+
 def export_dataframe(df, formats, base_folder_name=None, filename_base="report"):
     ensure_export_dir()
     tsfolder = base_folder_name if base_folder_name else datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -453,16 +900,17 @@ def export_dataframe(df, formats, base_folder_name=None, filename_base="report")
         return {"ok": False, "message": "DataFrame vazio"}
     if "csv" in formats:
         path = os.path.join(outdir, f"{filename_base}.csv")
-        df.to_csv(path, index=False, encoding="utf-8")
+        _write_csv(df, path)
         results.append(path)
     if "json" in formats:
         path = os.path.join(outdir, f"{filename_base}.json")
-        df.to_json(path, orient="records", force_ascii=False, date_unit="s")
+        _write_json(df, path)
         results.append(path)
     if "excel" in formats:
         path = os.path.join(outdir, f"{filename_base}.xlsx")
         try:
-            df.to_excel(path, index=False)
+            with XlsxStreamWriter(path) as writer:
+                writer.write_dataframe("Sheet1", df)
             results.append(path)
         except Exception:
             path2 = os.path.join(outdir, f"{filename_base}.txt")
@@ -472,6 +920,7 @@ def export_dataframe(df, formats, base_folder_name=None, filename_base="report")
     return {"ok": True, "paths": results, "folder": outdir}
 
 def import_file_to_table(filepath, tablename):
+    pd = _get_pd()
     ext = os.path.splitext(filepath)[1].lower()
     try:
         if ext in [".csv", ".txt"]:
@@ -485,70 +934,102 @@ def import_file_to_table(filepath, tablename):
     except Exception as e:
         return {"ok": False, "message": f"Erro ao ler arquivo: {e}"}
     cols = get_table_columns(tablename)
-    con = get_conn()
-    cur = con.cursor()
-    inserted = 0
-    updated = 0
+    # one vectorised pass turns every cell into str ("" for missing columns/values)
+    values = df.reindex(columns=cols, fill_value="").fillna("").astype(str).to_numpy(dtype=object).tolist()
+    col_idx = {c: i for i, c in enumerate(cols)}
+    colstr = ", ".join([f'"{c}"' for c in cols])
+    placeholders = ", ".join(["?" for _ in cols])
+    update_cols = [c for c in cols if c != "id"]
+    set_clause = ", ".join([f"{c}=?" for c in update_cols])
+    id_pos = col_idx.get("id")
+    inserts = []
+    updates = []
+    with _db_lock:
+        con = get_conn()
+        try:
+            with con:
+                cur = con.cursor()
+                existing = set()
+                if id_pos is not None:
+                    ensure_id_index(cur, tablename)
+                    existing = {str(r[0]) for r in cur.execute(f"SELECT id FROM \"{tablename}\"")}
+                # split rows into inserts/updates; an id repeated inside the file
+                # is inserted once and then updated, as a row-by-row upsert would
+                for row in values:
+                    idval = row[id_pos] if id_pos is not None else None
+                    if idval and idval in existing:
+                        updates.append(row[:id_pos] + row[id_pos+1:] + [idval])
+                    else:
+                        inserts.append(row)
+                        if idval:
+                            existing.add(idval)
+                if inserts:
+                    cur.executemany(f"INSERT INTO \"{tablename}\" ({colstr}) VALUES ({placeholders})", inserts)
+                if updates and update_cols:
+                    cur.executemany(f"UPDATE \"{tablename}\" SET {set_clause} WHERE id=?", updates)
+        except Exception as e:
+            return {"ok": False, "message": f"Erro ao importar: {e}"}
+        finally:
+            invalidate_schema_cache()
+    payload = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "acao": "IMPORT",
+        "tabela": tablename,
+        "arquivo": filepath,
+        "inseridos": len(inserts),
+        "atualizados": len(updates),
+        "ids_inseridos": [row[id_pos] for row in inserts] if id_pos is not None else [],
+        "ids_atualizados": [row[-1] for row in updates],
+        "usuario": CURRENT_USER
+    }
+    write_log_file(payload)
+    maybe_copy_db_backup()
+    schedule_mirror()
+    return {"ok": True, "inserted": len(inserts), "updated": len(updates)}
+
+# longest string value to_numeric still converts through a numpy unicode array
+_SHORT_TEXT = 32
+
+def to_numeric(series):
+    """
+    Coerces a column to numbers, accepting "," as decimal separator.
+    Columns that already have a numeric dtype are returned as-is.
+    """
+    pd = _get_pd()
+    import numpy as np
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    if (series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "string"
+            and series.str.len().max() <= _SHORT_TEXT):
+        # short string values: swap the separator on a fixed-width unicode array
+        # (numpy C loop); the array is sized to the longest value, so long free
+        # text (tuplas, parcelas) takes the pandas path below instead, and so do
+        # object columns of numbers/None (e.g. a concat with an all-NULL table)
+        values = np.char.replace(series.to_numpy(dtype=str), ",", ".")
+        return pd.Series(pd.to_numeric(values, errors="coerce"), index=series.index, name=series.name)
+    return pd.to_numeric(series.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+@functools.lru_cache(maxsize=4096)
+def parse_tuplas_str(s):
+    """
+    Parses a serialized 'tuplas' cell into a tuple of entries (empty when it
+    cannot be parsed). Cached: identical cells are common across rows.
+    """
+    if s == "" or s.lower() == "nan":
+        return ()
     try:
-        for _, row in df.iterrows():
-            rowdict = {c: (str(row.get(c, "")) if c in row.index else "") for c in cols}
-            idval = rowdict.get("id")
-            if idval:
-                cur.execute(f"SELECT COUNT(*) FROM \"{tablename}\" WHERE id=?", (idval,))
-                exists = cur.fetchone()[0] > 0
-                if exists:
-                    set_clause = ", ".join([f"{c}=?" for c in cols if c != "id"])
-                    vals = [rowdict[c] for c in cols if c != "id"] + [idval]
-                    cur.execute(f"UPDATE \"{tablename}\" SET {set_clause} WHERE id=?", vals)
-                    updated += 1
-                    payload = {
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "acao": "IMPORT_UPDATE",
-                        "tabela": tablename,
-                        "rowid": idval,
-                        "detalhes": rowdict,
-                        "usuario": CURRENT_USER
-                    }
-                    write_log_file(payload)
-                else:
-                    placeholders = ", ".join(["?" for _ in cols])
-                    colstr = ", ".join([f'"{c}"' for c in cols])
-                    vals = [rowdict[c] for c in cols]
-                    cur.execute(f"INSERT INTO \"{tablename}\" ({colstr}) VALUES ({placeholders})", vals)
-                    inserted += 1
-                    payload = {
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "acao": "IMPORT_INSERT",
-                        "tabela": tablename,
-                        "rowid": idval,
-                        "detalhes": rowdict,
-                        "usuario": CURRENT_USER
-                    }
-                    write_log_file(payload)
-            else:
-                placeholders = ", ".join(["?" for _ in cols])
-                colstr = ", ".join([f'"{c}"' for c in cols])
-                vals = [rowdict[c] for c in cols]
-                cur.execute(f"INSERT INTO \"{tablename}\" ({colstr}) VALUES ({placeholders})", vals)
-                inserted += 1
-                payload = {
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "acao": "IMPORT_INSERT",
-                    "tabela": tablename,
-                    "rowid": rowdict.get("id"),
-                    "detalhes": rowdict,
-                    "usuario": CURRENT_USER
-                }
-                write_log_file(payload)
-        con.commit()
-        #copy_db_backup()
-        mirror_db_to_excel()
-    except Exception as e:
-        con.rollback()
-        return {"ok": False, "message": f"Erro ao importar: {e}"}
-    finally:
-        con.close()
-    return {"ok": True, "inserted": inserted, "updated": updated}
+        parsed = ast.literal_eval(s)
+        if isinstance(parsed, (list, tuple)):
+            return tuple(parsed)
+    except Exception:
+        try:
+            s2 = s.replace("“", '"').replace("”", '"').replace("'", '"')
+            parsed = ast.literal_eval(s2)
+            if isinstance(parsed, (list, tuple)):
+                return tuple(parsed)
+        except Exception:
+            return ()
+    return ()
 
 # ---------------------------
 # GUI Helpers: style + fonts
@@ -585,10 +1066,14 @@ class FinanceManagerGUI(tk.Tk):
         self.selected_empresas = []
         self.check_vars = {}
         self.empresa_vars = {}
-        self._last_report_df = pd.DataFrame()
+        self._last_report_df = None
+        self.sheet = None
+        self._sums_label = None
         self._active_canvas_bindings = []
         self._graph_canvas = None
         self._graph_toolbar = None
+        self._tuplas_cache = {}
+        self._tuplas_cache_sig = None
         self._update_button = None  # reference to Atualizar button
         self._build_ui()
         self.show_home()
@@ -746,30 +1231,28 @@ class FinanceManagerGUI(tk.Tk):
 
     # robust scroll behavior to avoid overscroll
     def _make_canvas_scrollable(self, canvas, inner_frame):
-        def on_frame_config(e=None):
-            bbox = canvas.bbox("all")
-            canvas.configure(scrollregion=bbox if bbox else (0,0,0,0))
-            if not bbox:
-                return
-            content_height = bbox[3] - bbox[1]
-            content_width = bbox[2] - bbox[0]
+        # inner_frame is the only canvas item (anchored at 0,0), so its size from
+        # the <Configure> event is the scrollregion; no layout pass or bbox scan
+        content = {"width": 0, "height": 0}
+        def on_frame_config(e):
+            content["width"], content["height"] = e.width, e.height
+            canvas.configure(scrollregion=(0, 0, e.width, e.height))
             try:
                 ch = canvas.winfo_height()
                 cw = canvas.winfo_width()
             except Exception:
                 ch = cw = 0
-            if content_height <= ch:
+            if e.height <= ch:
                 canvas.yview_moveto(0)
-            if content_width <= cw:
+            if e.width <= cw:
                 canvas.xview_moveto(0)
-        inner_frame.bind("<Configure>", lambda e: on_frame_config())
+        inner_frame.bind("<Configure>", on_frame_config)
 
         def _on_mousewheel(event):
-            bbox = canvas.bbox("all")
-            if not bbox:
+            content_height = content["height"]
+            content_width = content["width"]
+            if not content_height and not content_width:
                 return "break"
-            content_height = bbox[3] - bbox[1]
-            content_width = bbox[2] - bbox[0]
             ch = canvas.winfo_height()
             cw = canvas.winfo_width()
             if content_height > ch:
@@ -795,8 +1278,6 @@ class FinanceManagerGUI(tk.Tk):
                 self._active_canvas_bindings.remove(b)
         canvas.bind("<Enter>", _enter)
         canvas.bind("<Leave>", _leave)
-        inner_frame.update_idletasks()
-        on_frame_config()
 
     # ----------------- Tables view -----------------
     def show_tables(self):
@@ -825,11 +1306,7 @@ class FinanceManagerGUI(tk.Tk):
                 col = 0
                 row += 1
 
-        all_empresas = set()
-        for t in tables:
-            df = fetch_table(t)
-            if "empresa" in df.columns:
-                all_empresas.update([str(e) for e in df["empresa"].unique() if pd.notnull(e)])
+        all_empresas = listar_empresas(tables)
         if all_empresas:
             empframe = ttk.LabelFrame(outer, text="Filtrar por empresa", padding=8)
             empframe.pack(fill="x", pady=(6,10))
@@ -888,57 +1365,66 @@ class FinanceManagerGUI(tk.Tk):
                     messagebox.showerror("Erro", f"Falha ao excluir tabela: {e}")
         ttk.Button(top, text="Excluir",  command=do_delete).grid(row=1, column=0, columnspan=2, pady=10)
 
-    def update_table_display(self):
+    def _clear_table_display(self):
         for widget in self.display_tables_frame.winfo_children():
             widget.destroy()
+        self.sheet = None
+        self._sums_label = None
+
+    def update_table_display(self):
+        pd = _get_pd()
+        import numpy as np
         self.selected_tables = [t for t, v in self.check_vars.items() if v.get()]
         self.selected_empresas = [e for e, v in self.empresa_vars.items() if v.get()] if self.empresa_vars else []
         if not self.selected_tables:
+            self._clear_table_display()
             ttk.Label(self.display_tables_frame, text="Selecione ao menos uma tabela acima para visualizar.", padding=12).pack()
             return
 
         def safe_sum(series):
-            s = series.astype(str).str.replace(",", ".")
-            nums = pd.to_numeric(s, errors="coerce")
-            return nums.sum()
-
-        all_dfs = []
-        for table in self.selected_tables:
-            df = fetch_table(table)
-            if self.selected_empresas and "empresa" in df.columns:
-                df = df[df["empresa"].astype(str).isin(self.selected_empresas)]
-            df["__tabela"] = table
-            all_dfs.append(df)
+            return to_numeric(series).sum()
+
+        # each table is read once per refresh, already filtered by company and
+        # sorted by id in SQL; appending the tables in name order gives the
+        # (__tabela, id) order without a sort
+        empresa_filter = self.selected_empresas or None
+        df_map = {t: fetch_table(t, ordered=True, empresas=empresa_filter) for t in self.selected_tables}
+        row_tables = sorted(self.selected_tables)
+        all_dfs = [df_map[t] for t in row_tables]
         if not all_dfs:
+            self._clear_table_display()
             ttk.Label(self.display_tables_frame, text="Sem dados para as seleções.", padding=12).pack()
             return
-        concat_df = pd.concat(all_dfs, ignore_index=True)
-        concat_df = concat_df.sort_values(["__tabela", "id"] if "id" in concat_df.columns else ["__tabela"])
-
-        cols = []
-        for t in self.selected_tables:
-            tcols = config.get_visual(t, list(fetch_table(t).columns))
-            for c in tcols:
-                if c not in cols and c in concat_df.columns:
-                    cols.append(c)
+        # align every frame to the column union first so concat takes the aligned path
+        union = list(dict.fromkeys(c for df in all_dfs for c in df.columns))
+        concat_df = pd.concat([df.reindex(columns=union) for df in all_dfs], ignore_index=True)
+        concat_df["__tabela"] = np.repeat(row_tables, [len(df) for df in all_dfs])
+
+        present = set(concat_df.columns)
+        cols = list(dict.fromkeys(
+            c for t in self.selected_tables for c in config.get_visual(t, get_table_columns(t)) if c in present
+        ))
         if "__tabela" not in cols:
             cols = ["__tabela"] + cols
 
-        # create SheetFrame (which contains selection logic)
-        self.sheet = SheetFrame(self.display_tables_frame, concat_df, cols, self)
-        self.sheet.pack(fill="both", expand=True, padx=8, pady=8)
-
-        sums_frame = ttk.Frame(self.display_tables_frame, padding=8)
-        sums_frame.pack(fill="x")
-        infos = []
-        if "id" in concat_df.columns:
-            infos.append(f"Total IDs: {concat_df['id'].count()}")
-        for field in ["valor_adquirido", "saldo_devedor", "saldo_devedor_com_juros"]:
-            if field in concat_df.columns:
-                infos.append(f"Soma {field}: {format_number(safe_sum(concat_df[field]))}")
-        ttk.Label(sums_frame, text=" | ".join(infos), font=self.font_normal).pack(anchor="w")
-        self.display_tables_frame.update_idletasks()
-        self.sheet_canvas.configure(scrollregion=self.sheet_canvas.bbox("all") or (0,0,0,0))
+        sums = {f: safe_sum(concat_df[f]) for f in ["valor_adquirido", "saldo_devedor", "saldo_devedor_com_juros"] if f in concat_df.columns}
+        infos = [f"Total IDs: {concat_df['id'].count()}"] if "id" in concat_df.columns else []
+        infos += [f"Soma {f}: {format_number(v)}" for f, v in sums.items()]
+
+        # same columns: push the new rows into the existing sheet instead of rebuilding it
+        if self.sheet is not None and self.sheet.winfo_exists() and self.sheet.columns == cols:
+            self.sheet.update_data(concat_df)
+            self._sums_label.configure(text=" | ".join(infos))
+        else:
+            self._clear_table_display()
+            # create SheetFrame (which contains selection logic)
+            self.sheet = SheetFrame(self.display_tables_frame, concat_df, cols, self)
+            self.sheet.pack(fill="both", expand=True, padx=8, pady=8)
+
+            sums_frame = ttk.Frame(self.display_tables_frame, padding=8)
+            sums_frame.pack(fill="x")
+            self._sums_label = ttk.Label(sums_frame, text=" | ".join(infos), font=self.font_normal)
+            self._sums_label.pack(anchor="w")
 
     def create_table_dialog(self):
         nome = simpledialog.askstring("Nova Tabela", "Nome da nova tabela padrão:")
@@ -1023,7 +1509,7 @@ class FinanceManagerGUI(tk.Tk):
                 if res.get("ok"):
                     outpaths += res.get("paths", [])
             # ensure geral sheet included in mirror
-            mirror_db_to_excel()
+            schedule_mirror()
             if outpaths:
                 messagebox.showinfo("Exportado", f"Arquivos gerados em: {os.path.join(EXPORT_DIR, tsfolder)}")
                 top.destroy()
@@ -1036,12 +1522,13 @@ class FinanceManagerGUI(tk.Tk):
         if not file:
             return
         try:
-            con = sqlite3.connect(file)
-            cur = con.cursor()
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table' LIMIT 1")
-            con.close()
             global DB_FILE
-            DB_FILE = file
+            # probe through the shared connection; on success it is already the one for the new DB
+            with _db_lock:
+                cur = get_conn(file).cursor()
+                cur.execute("SELECT name FROM sqlite_master WHERE type='table' LIMIT 1")
+                DB_FILE = file
+            invalidate_schema_cache()
             config.set_db_path(file)
             messagebox.showinfo("Pronto", f"Banco de dados selecionado: {file}")
             self.show_tables()
@@ -1110,26 +1597,34 @@ class FinanceManagerGUI(tk.Tk):
         cols_frame = ttk.Frame(typetab)
         cols_frame.grid(row=1, column=0, columnspan=2, sticky="nsew", pady=6)
         typemap_widgets = {}
+        # (label, combobox) rows are created once and reused on every table switch
+        type_rows = []
 
         def on_table_select_types(event=None):
-            for w in cols_frame.winfo_children():
-                w.destroy()
             typemap_widgets.clear()
             tab = table_combo2.get()
             if not tab:
-                return
-            if tab == "*":
                 allcols = []
-                for t in listar_tabelas():
-                    for c in get_table_columns(t):
-                        if c not in allcols:
-                            allcols.append(c)
+            elif tab == "*":
+                allcols = list(dict.fromkeys(c for t in listar_tabelas() for c in get_table_columns(t)))
             else:
                 allcols = get_table_columns(tab)
-            for idx, c in enumerate(allcols):
-                ttk.Label(cols_frame, text=c+":").grid(row=idx, column=0, sticky="w", padx=4, pady=2)
+            while len(type_rows) < len(allcols):
+                idx = len(type_rows)
+                lbl = ttk.Label(cols_frame)
+                lbl.grid(row=idx, column=0, sticky="w", padx=4, pady=2)
                 cb = ttk.Combobox(cols_frame, values=["text", "int", "float", "date"], width=12)
                 cb.grid(row=idx, column=1, sticky="w", padx=4, pady=2)
+                type_rows.append((lbl, cb))
+            for idx, (lbl, cb) in enumerate(type_rows):
+                if idx >= len(allcols):
+                    lbl.grid_remove()
+                    cb.grid_remove()
+                    continue
+                c = allcols[idx]
+                lbl.configure(text=c+":")
+                lbl.grid()
+                cb.grid()
                 cb.set(config.get_col_type(tab, c))
                 typemap_widgets[c] = cb
 
@@ -1155,34 +1650,45 @@ class FinanceManagerGUI(tk.Tk):
         pad_cols_frame = ttk.Frame(pad_tab)
         pad_cols_frame.grid(row=1, column=0, columnspan=2, sticky="nsew", pady=6)
         pad_widgets = {}
+        # pooled rows: (label, mode combobox, values entry, required var, required checkbox)
+        pad_rows = []
 
         def on_pad_table_selected(event=None):
-            for w in pad_cols_frame.winfo_children():
-                w.destroy()
             pad_widgets.clear()
             tab = pad_table_combo.get()
             if not tab:
-                return
-            if tab == "*":
                 allcols = []
-                for t in listar_tabelas():
-                    for c in get_table_columns(t):
-                        if c not in allcols:
-                            allcols.append(c)
+            elif tab == "*":
+                allcols = list(dict.fromkeys(c for t in listar_tabelas() for c in get_table_columns(t)))
             else:
                 allcols = get_table_columns(tab)
-            for idx, c in enumerate(allcols):
-                ttk.Label(pad_cols_frame, text=c+":").grid(row=idx, column=0, sticky="w", padx=4, pady=2)
+            while len(pad_rows) < len(allcols):
+                idx = len(pad_rows)
+                lbl = ttk.Label(pad_cols_frame)
+                lbl.grid(row=idx, column=0, sticky="w", padx=4, pady=2)
                 mode_cb = ttk.Combobox(pad_cols_frame, values=["free", "fixed"], width=8)
                 mode_cb.grid(row=idx, column=1, sticky="w", padx=4, pady=2)
-                std = config.get_col_standardization(tab, c)
-                mode_cb.set(std.get("mode", "free"))
                 vals_entry = ttk.Entry(pad_cols_frame, width=40)
                 vals_entry.grid(row=idx, column=2, sticky="w", padx=4, pady=2)
-                vals_entry.insert(0, ",".join(std.get("values", [])))
-                required_var = tk.BooleanVar(value=std.get("required", False))
+                required_var = tk.BooleanVar(value=False)
                 req_cb = ttk.Checkbutton(pad_cols_frame, text="Obrigatório", variable=required_var)
                 req_cb.grid(row=idx, column=3, sticky="w", padx=6, pady=2)
+                pad_rows.append((lbl, mode_cb, vals_entry, required_var, req_cb))
+            for idx, (lbl, mode_cb, vals_entry, required_var, req_cb) in enumerate(pad_rows):
+                widgets = (lbl, mode_cb, vals_entry, req_cb)
+                if idx >= len(allcols):
+                    for w in widgets:
+                        w.grid_remove()
+                    continue
+                c = allcols[idx]
+                std = config.get_col_standardization(tab, c)
+                lbl.configure(text=c+":")
+                mode_cb.set(std.get("mode", "free"))
+                vals_entry.delete(0, tk.END)
+                vals_entry.insert(0, ",".join(std.get("values", [])))
+                required_var.set(std.get("required", False))
+                for w in widgets:
+                    w.grid()
                 pad_widgets[c] = (mode_cb, vals_entry, required_var)
 
         pad_table_combo.bind("<<ComboboxSelected>>", on_pad_table_selected)
@@ -1217,10 +1723,18 @@ class FinanceManagerGUI(tk.Tk):
         def clear_db_setting():
             global DB_FILE
             DB_FILE = DEFAULT_DB
+            invalidate_schema_cache()
             config.set_db_path("")
             messagebox.showinfo("Pronto", "Retornou ao DB padrão.")
             self.show_config()
         ttk.Button(dbtab, text="Resetar para DB padrão", command=clear_db_setting).pack(padx=8, pady=4)
+        mirror_var = tk.BooleanVar(value=config.mirror_excel)
+        ttk.Checkbutton(
+            dbtab,
+            text="Espelhar o DB em Excel após cada alteração",
+            variable=mirror_var,
+            command=lambda: config.set_mirror_excel(mirror_var.get())
+        ).pack(anchor="w", padx=8, pady=4)
 
     def show_reports(self):
         self.clear_main()
@@ -1234,45 +1748,51 @@ class FinanceManagerGUI(tk.Tk):
         self.report_area.pack(fill="both", expand=False, padx=8, pady=8)
 
     def show_report_mode(self, mode):
+        pd = _get_pd()
         tables = listar_tabelas()
         allcols = get_table_columns(tables[0]) if tables else []
         default_cols = [c for c in allcols if c != "id"]
         selcols = config.get_report(default_cols)
+        readcols = list(dict.fromkeys(selcols + ["empresa"])) if mode == "empresa" else selcols
         text = ""
         def safe_sum(series):
-            s = series.astype(str).str.replace(",", ".")
-            nums = pd.to_numeric(s, errors="coerce")
-            return nums.sum()
+            return to_numeric(series).sum()
         def safe_mean(series):
-            s = series.astype(str).str.replace(",", ".")
-            nums = pd.to_numeric(s, errors="coerce")
-            return nums.mean()
+            return to_numeric(series).mean()
         def is_num_col(series):
             try:
-                nums = pd.to_numeric(series.astype(str).str.replace(",", "."), errors="coerce")
-                return nums.notnull().sum() > 0
+                return to_numeric(series).notnull().any()
             except Exception:
                 return False
+        def numeric_frame(df):
+            # coerce each report column once; the per-group stats below reuse it
+            num_df = df.copy()
+            for c in selcols:
+                if c in num_df.columns and c not in ("id", "empresa"):
+                    num_df[c] = to_numeric(num_df[c])
+            return num_df
 
         if mode == "empresa":
             dfs = []
             for t in tables:
-                df = fetch_table(t)
+                df = fetch_table(t, columns=readcols)
                 if len(df) > 0:
                     df["banco"] = t
                     dfs.append(df)
             if dfs:
                 bigdf = pd.concat(dfs, ignore_index=True)
                 if "empresa" in bigdf.columns:
-                    for emp, dfg in bigdf.groupby("empresa"):
-                        if str(emp).strip() == "" or dfg.empty:
-                            continue
+                    num_df = numeric_frame(bigdf)
+                    num_df = num_df[num_df["empresa"].astype(str).str.strip() != ""]
+                    statcols = [c for c in dict.fromkeys(selcols) if c not in ("id", "empresa") and c in num_df.columns]
+                    # one groupby for every company/column; count == 0 means no numeric value in that group
+                    grouped = num_df.groupby("empresa", observed=True)
+                    stats = grouped[statcols].agg(["sum", "mean", "count"]) if statcols else pd.DataFrame(index=grouped.size().index)
+                    for emp, row in zip(stats.index, stats.to_numpy()):
                         text += f"Empresa: {emp}\n"
-                        for col in selcols:
-                            if col == "id": continue
-                            if col in dfg.columns and is_num_col(dfg[col]):
-                                soma = safe_sum(dfg[col])
-                                media = safe_mean(dfg[col])
+                        for k, col in enumerate(statcols):
+                            soma, media, count = row[3*k:3*k+3]
+                            if count > 0:
                                 text += f"  {col}: soma={format_number(soma)}, média={format_number(media)}\n"
                         text += "\n"
                 self._last_report_df = bigdf
@@ -1282,15 +1802,16 @@ class FinanceManagerGUI(tk.Tk):
             text = ""
             biglist = []
             for t in tables:
-                df = fetch_table(t)
+                df = fetch_table(t, columns=readcols)
                 if len(df) == 0:
                     continue
                 text += f"Banco: {t}\n"
+                num_df = numeric_frame(df)
                 for col in selcols:
                     if col == "id": continue
-                    if col in df.columns and is_num_col(df[col]):
-                        soma = safe_sum(df[col])
-                        media = safe_mean(df[col])
+                    if col in num_df.columns and is_num_col(num_df[col]):
+                        soma = safe_sum(num_df[col])
+                        media = safe_mean(num_df[col])
                         text += f"  {col}: soma={format_number(soma)}, média={format_number(media)}\n"
                 text += "\n"
                 df["__banco"] = t
@@ -1299,16 +1820,17 @@ class FinanceManagerGUI(tk.Tk):
         elif mode == "geral":
             dfs = []
             for t in tables:
-                df = fetch_table(t)
+                df = fetch_table(t, columns=readcols)
                 dfs.append(df)
             if dfs:
                 bigdf = pd.concat(dfs, ignore_index=True)
                 text += "Geral:\n"
+                num_df = numeric_frame(bigdf)
                 for col in selcols:
                     if col == "id": continue
-                    if col in bigdf.columns and is_num_col(bigdf[col]):
-                        soma = safe_sum(bigdf[col])
-                        media = safe_mean(bigdf[col])
+                    if col in num_df.columns and is_num_col(num_df[col]):
+                        soma = safe_sum(num_df[col])
+                        media = safe_mean(num_df[col])
                         text += f"  {col}: soma={format_number(soma)}, média={format_number(media)}\n"
                 self._last_report_df = bigdf
             else:
@@ -1379,24 +1901,42 @@ class FinanceManagerGUI(tk.Tk):
             return []
         if isinstance(val, list):
             return val
-        s = str(val).strip()
-        if s == "" or s.lower() == "nan":
-            return []
-        try:
-            parsed = ast.literal_eval(s)
-            if isinstance(parsed, (list, tuple)):
-                return list(parsed)
-        except Exception:
-            try:
-                s2 = s.replace("“", '"').replace("”", '"').replace("'", '"')
-                parsed = ast.literal_eval(s2)
-                if isinstance(parsed, (list, tuple)):
-                    return list(parsed)
-            except Exception:
-                return []
-        return []
+        return list(parse_tuplas_str(str(val).strip()))
+
+    def _tuplas_frame(self, tuplas, min_len=0):
+        """
+        Flattens a 'tuplas' column into a DataFrame with one row per tuple;
+        columns are the tuple positions (0 = valor, 1 = data, 2 = empresa, ...).
+        Tuples shorter than min_len are dropped; the rest are padded with None
+        up to the longest one, so a None can be padding or a real value: filter
+        by min_len, not by isna(). Columns stay object dtype so a real None
+        reads back as None (str() -> "None") instead of being inferred to NaN.
+        """
+        pd = _get_pd()
+        items = tuplas.map(self._parse_tuplas_field).explode().dropna()
+        return pd.DataFrame([t for t in items if isinstance(t, (list, tuple)) and len(t) >= min_len], dtype=object)
+
+    def _bank_tuplas(self, bank, min_len=0):
+        """
+        _tuplas_frame of a bank's 'tuplas' column, cached per DB state so filter
+        changes and repeated graph generations do not re-read or re-parse it.
+        Callers must not modify the returned frame.
+        """
+        pd = _get_pd()
+        sig = db_signature()
+        key = (bank, min_len)
+        if self._tuplas_cache_sig != sig:
+            self._tuplas_cache = {}
+            self._tuplas_cache_sig = sig
+        tdf = self._tuplas_cache.get(key)
+        if tdf is None:
+            df = fetch_table(bank, columns=["tuplas"])
+            tdf = self._tuplas_frame(df["tuplas"], min_len) if "tuplas" in df.columns else pd.DataFrame()
+            self._tuplas_cache[key] = tdf
+        return tdf
 
     def _update_graph_companies_and_range(self):
+        pd = _get_pd()
         selected_banks = [b for b, v in self.graph_bank_vars.items() if v.get()]
         for w in self.company_frame.winfo_children():
             w.destroy()
@@ -1404,21 +1944,16 @@ class FinanceManagerGUI(tk.Tk):
         all_companies = set()
         all_dates = []
         for b in selected_banks:
-            df = fetch_table(b)
-            if "tuplas" not in df.columns:
-                continue
-            for _, row in df.iterrows():
-                tupl = self._parse_tuplas_field(row.get("tuplas"))
-                for t in tupl:
-                    try:
-                        empresa = str(t[2]) if len(t) > 2 else ""
-                        date_str = t[1] if len(t) > 1 else None
-                        all_companies.add(empresa)
-                        if date_str:
-                            dt = datetime.strptime(date_str, "%d-%m-%Y")
-                            all_dates.append(dt)
-                    except Exception:
-                        continue
+            # every tuple with an empresa position counts, a None empresa as "None"
+            companies = self._bank_tuplas(b, min_len=3)
+            if 2 in companies.columns:
+                all_companies.update(companies[2].map(str).unique())
+            tdf = self._bank_tuplas(b)
+            if 1 in tdf.columns:
+                # repeated date strings are parsed once (cache=True)
+                dates = pd.to_datetime(tdf[1], format="%d-%m-%Y", errors="coerce", cache=True).dropna()
+                if not dates.empty:
+                    all_dates += [dates.min(), dates.max()]
         sorted_companies = sorted([c for c in all_companies if c.strip() != ""])
         for idx, comp in enumerate(sorted_companies):
             v = tk.BooleanVar(value=True)
@@ -1451,6 +1986,8 @@ class FinanceManagerGUI(tk.Tk):
             self.end_year_cb.set(str(now.year))
 
     def _generate_graph(self):
+        pd = _get_pd()
+        _load_matplotlib()
         selected_banks = [b for b, v in self.graph_bank_vars.items() if v.get()]
         if not selected_banks:
             messagebox.showerror("Erro", "Selecione ao menos um banco (tabela).")
@@ -1475,67 +2012,66 @@ class FinanceManagerGUI(tk.Tk):
             messagebox.showerror("Erro", "Período inválido. Selecione mês e ano.")
             return
 
-        agg = {}
-        groups = set()
-        for b in selected_banks:
-            df = fetch_table(b)
-            if "tuplas" not in df.columns:
+        # sqlite reads go through the one shared connection under _db_lock, so a
+        # thread pool would only queue on the lock; the parsed frames are cached
+        # until the DB changes, so changing filters and regenerating skips the parse
+        frames = {b: self._bank_tuplas(b, min_len=3) for b in selected_banks}
+        parts = []
+        for b, tdf in frames.items():
+            # tuple layout: (valor_pago, data, empresa, ..., ..., amortizacao)
+            if tdf.empty:
                 continue
-            for _, row in df.iterrows():
-                tupl = self._parse_tuplas_field(row.get("tuplas"))
-                for t in tupl:
-                    try:
-                        valor_pago = float(t[0]) if t[0] is not None else 0.0
-                        date_str = t[1]
-                        empresa = str(t[2])
-                        amortizacao = float(t[5]) if len(t) > 5 and t[5] is not None else 0.0
-                        juros = valor_pago - amortizacao
-                        dt = datetime.strptime(date_str, "%d-%m-%Y")
-                    except Exception:
-                        continue
-                    if not (start_dt <= dt < end_dt):
-                        continue
-                    if empresa not in selected_companies:
-                        continue
-                    if grouping == "por_empresa":
-                        group = empresa
-                    elif grouping == "por_banco":
-                        group = b
-                    else:
-                        group = "TOTAL"
-                    groups.add(group)
-                    key = (dt.year, dt.month)
-                    if key not in agg:
-                        agg[key] = {}
-                    if group not in agg[key]:
-                        agg[key][group] = 0.0
-                    if metric == "parcelas":
-                        agg[key][group] += valor_pago
-                    elif metric == "amortizacao":
-                        agg[key][group] += amortizacao
-                    elif metric == "juros":
-                        agg[key][group] += juros
-
-        if not agg:
+            valor_pago = pd.to_numeric(tdf[0], errors="coerce")
+            # a None amount counts as 0; anything non-numeric drops the tuple
+            ok = valor_pago.notna() | tdf[0].isna()
+            if 5 in tdf.columns:
+                amortizacao = pd.to_numeric(tdf[5], errors="coerce")
+                ok &= amortizacao.notna() | tdf[5].isna()
+                amortizacao = amortizacao.fillna(0.0)
+            else:
+                amortizacao = pd.Series(0.0, index=tdf.index)
+            valor_pago = valor_pago.fillna(0.0)
+            dates = pd.to_datetime(tdf[1], format="%d-%m-%Y", errors="coerce", cache=True)
+            empresa = tdf[2].map(str)
+            ok &= dates.notna() & (dates >= start_dt) & (dates < end_dt) & empresa.isin(selected_companies)
+            if grouping == "por_empresa":
+                group = empresa
+            elif grouping == "por_banco":
+                group = b
+            else:
+                group = "TOTAL"
+            if metric == "parcelas":
+                value = valor_pago
+            elif metric == "amortizacao":
+                value = amortizacao
+            elif metric == "juros":
+                value = valor_pago - amortizacao
+            else:
+                value = 0.0
+            part = pd.DataFrame({"date": dates, "group": group, "value": value}, index=tdf.index)
+            parts.append(part[ok])
+
+        data = pd.concat(parts, ignore_index=True) if parts else None
+        if data is None or data.empty:
             messagebox.showinfo("Aviso", "Nenhum dado encontrado para os filtros selecionados.")
             return
 
-        keys_sorted = sorted(agg.keys())
-        index = [datetime(y, m, 1) for (y, m) in keys_sorted]
-        data = {g: [] for g in sorted(groups)}
-        for k in keys_sorted:
-            row = agg.get(k, {})
-            for g in sorted(groups):
-                data[g].append(row.get(g, 0.0))
-        plot_df = pd.DataFrame(data, index=index)
+        # one row per month with data, one column per group (sorted), missing combinations = 0
+        month = data["date"].dt.to_period("M")
+        plot_df = data["value"].astype(float).groupby([month, data["group"]]).sum().unstack(fill_value=0.0)
+        plot_df.index = plot_df.index.to_timestamp()
+        plot_df.index.name = None
+        plot_df.columns.name = None
 
         for w in self.graph_canvas_holder.winfo_children():
             w.destroy()
         fig, ax = plt.subplots(figsize=(11, 5.5))
-        lines = []
-        for col in plot_df.columns:
-            line, = ax.plot(plot_df.index, plot_df[col], marker='o', label=col)
-            lines.append(line)
+        # long ranges: keep every point on the line but draw at most ~120 markers per series
+        step = max(1, len(plot_df) // 120)
+        # one plot call for all groups: a 2-D y gives one Line2D per column
+        lines = ax.plot(plot_df.index, plot_df.to_numpy(), marker='o', markevery=step)
+        for line, col in zip(lines, plot_df.columns):
+            line.set_label(col)
         ax.set_title({
             "parcelas": "Soma das parcelas por mês",
             "amortizacao": "Soma da amortização por mês",
@@ -1591,34 +2127,49 @@ class FinanceManagerGUI(tk.Tk):
             self._update_button.config(state="disabled", text="Atualizando...")
 
         def _run():
+            ts = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+            logpath = os.path.join(LOGS_DIR, f"atualizar_output_{ts}.log")
             try:
-                # Run with same interpreter
-                proc = subprocess.run([sys.executable, script_path], capture_output=True, text=True, cwd=BASE_DIR, timeout=600)
-                stdout = proc.stdout or ""
-                stderr = proc.stderr or ""
-                returncode = proc.returncode
-            except subprocess.TimeoutExpired as e:
-                stdout = e.stdout or ""
-                stderr = f"TimeoutExpired: {e}"
-                returncode = -1
-            except Exception as e:
-                stdout = ""
-                stderr = traceback.format_exc()
-                returncode = -2
-
-            # write outputs to log file
-            try:
-                ts = datetime.now().strftime("%Y-%m-%d_%H%M%S")
-                logpath = os.path.join(LOGS_DIR, f"atualizar_output_{ts}.log")
-                with open(logpath, "w", encoding="utf-8") as f:
-                    f.write("=== STDOUT ===\n")
-                    f.write(stdout + "\n")
-                    f.write("=== STDERR ===\n")
-                    f.write(stderr + "\n")
+                log = open(logpath, "w", encoding="utf-8")
                 logmsg = f"Saída gravada em {logpath}"
             except Exception:
+                log = open(os.devnull, "w", encoding="utf-8")
                 logmsg = "Falha ao gravar log de saída."
 
+            timed_out = threading.Event()
+            with log:
+                try:
+                    log.write("=== STDOUT + STDERR ===\n")
+                    # Run with same interpreter, unbuffered, so its output reaches the log line by line
+                    proc = subprocess.Popen([sys.executable, script_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                            text=True, errors="replace", bufsize=1, cwd=BASE_DIR,
+                                            env={**os.environ, "PYTHONUNBUFFERED": "1"})
+                    def _kill():
+                        timed_out.set()
+                        proc.kill()
+                    # reading blocks until the child closes its output, so the timeout kills it instead
+                    watchdog = threading.Timer(600, _kill)
+                    watchdog.daemon = True
+                    watchdog.start()
+                    try:
+                        for line in proc.stdout:
+                            log.write(line)
+                        returncode = proc.wait()
+                    finally:
+                        watchdog.cancel()
+                        if proc.poll() is None:
+                            proc.kill()
+                        proc.stdout.close()
+                    if timed_out.is_set():
+                        log.write("TimeoutExpired: script interrompido após 600 s\n")
+                        returncode = -1
+                except Exception:
+                    returncode = -2
+                    try:
+                        log.write(traceback.format_exc())
+                    except Exception:
+                        pass
+
             # schedule UI update on main thread
             def _on_complete():
                 if self._update_button:
@@ -1628,10 +2179,9 @@ class FinanceManagerGUI(tk.Tk):
                 else:
                     messagebox.showerror("Atualização com erro", f"Código de saída: {returncode}\nVerifique o log: {logmsg}")
                 # After update, refresh mirror and current view
-                try:
-                    mirror_db_to_excel()
-                except Exception:
-                    pass
+                invalidate_schema_cache()
+                self._tuplas_cache = {}
+                schedule_mirror()
                 try:
                     # If currently viewing tables, refresh
                     self.show_tables()
@@ -1645,90 +2195,153 @@ class FinanceManagerGUI(tk.Tk):
 
 # ----------------- SheetFrame Implementation -----------------
 class SheetFrame(ttk.Frame):
+    # the Treeview shows at most this many rows and scrolls the rest itself
+    VISIBLE_ROWS = 30
+    # rows inserted per idle callback; the first chunk is shown right away
+    INSERT_CHUNK = 500
+    # column widths are measured on this many leading rows, once per data load
+    WIDTH_SAMPLE = 200
+    # columns summed in the footer
+    SUM_FIELDS = ["valor_adquirido", "saldo_devedor", "saldo_devedor_com_juros"]
+
     def __init__(self, master, df, columns, gui):
         super().__init__(master, padding=6)
         self.df = df.copy().reset_index(drop=True)
         self.columns = columns
         self.gui = gui
         self.sort_state = {}
-        self.entries = {}
         self.selected_row = None
+        self._fill_job = None
+        self._totals = {}
         self.sheet_frame = ttk.Frame(self)
         self.sheet_frame.pack(fill="both", expand=True)
+        # one native widget for the whole grid; item iids are the row positions in self.df
+        self.tree = ttk.Treeview(self.sheet_frame, columns=self.columns, show="headings", selectmode="browse")
+        self.vsb = ttk.Scrollbar(self.sheet_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.vsb.set)
+        self.tree.grid(row=0, column=0, columnspan=3, sticky="nsew")
+        self.vsb.grid(row=0, column=3, sticky="ns")
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<Double-1>", self._cell_double_click)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.stats_label = ttk.Label(self.sheet_frame)
+        self.stats_label.grid(row=1, column=0, columnspan=3, sticky="ew", pady=(6,2))
+        self.addbtn = ttk.Button(self.sheet_frame, text="+ Adicionar linha", command=self.add_row)
+        self.delbtn = ttk.Button(self.sheet_frame, text="Excluir linha selecionada", command=self.delete_selection)
+        self.movebtn = ttk.Button(self.sheet_frame, text="Mover linha para outra tabela", command=self.move_row_dialog)
+        self.addbtn.grid(row=2, column=0, sticky="ew", pady=(8,4))
+        self.delbtn.grid(row=2, column=1, sticky="ew", pady=(8,4))
+        self.movebtn.grid(row=2, column=2, sticky="ew", pady=(8,4))
         self.build_table()
-        stats_row = len(self.df) + 1
-        stats = []
-        id_count = self.df['id'].count() if 'id' in self.df.columns else 0
-        if 'id' in self.df.columns:
-            stats.append(f"Total IDs: {id_count}")
-        def safe_sum(field):
-            if field not in self.df.columns:
-                return 0
-            s = self.df[field].astype(str).str.replace(",", ".")
-            nums = pd.to_numeric(s, errors="coerce")
-            return nums.sum()
-        for field in ["valor_adquirido", "saldo_devedor", "saldo_devedor_com_juros"]:
-            if field in self.df.columns:
-                soma = safe_sum(field)
-                stats.append(f"Soma {field}: {format_number(soma)}")
-        ttk.Label(self.sheet_frame, text=" | ".join(stats)).grid(row=stats_row, column=0, columnspan=len(self.columns), sticky="ew", pady=(6,2))
-        addbtn = ttk.Button(self.sheet_frame, text="+ Adicionar linha", command=self.add_row)
-        addbtn.grid(row=stats_row+1, column=0, columnspan=max(1, len(self.columns)//3), sticky="ew", pady=(8,4))
-        delbtn = ttk.Button(self.sheet_frame, text="Excluir linha selecionada", command=self.delete_selection)
-        delbtn.grid(row=stats_row+1, column=max(1, len(self.columns)//3), columnspan=max(1, len(self.columns)//3), sticky="ew", pady=(8,4))
-        movebtn = ttk.Button(self.sheet_frame, text="Mover linha para outra tabela", command=self.move_row_dialog)
-        movebtn.grid(row=stats_row+1, column=2*max(1, len(self.columns)//3), columnspan=max(1, len(self.columns)//3), sticky="ew", pady=(8,4))
+
+    def update_data(self, df):
+        """Shows a new DataFrame (same columns) in the existing Treeview."""
+        self.df = df.copy().reset_index(drop=True)
+        self.selected_row = None
+        self._size_columns()
+        self._render_rows()
+
+    def _compute_totals(self):
+        # to_numeric skips the string round-trip for columns that are already numeric
+        self._totals = {f: to_numeric(self.df[f]).sum() for f in self.SUM_FIELDS if f in self.df.columns}
+
+    def _stats_text(self):
+        stats = [f"Total IDs: {self.df['id'].count()}"] if 'id' in self.df.columns else []
+        stats += [f"Soma {field}: {format_number(total)}" for field, total in self._totals.items()]
+        return " | ".join(stats)
 
     def build_table(self):
-        for w in self.sheet_frame.winfo_children():
-            w.destroy()
-        self.entries.clear()
-        self.col_widths = []
-        for j, col in enumerate(self.columns):
-            header = ttk.Label(self.sheet_frame, text=col, background="#e6f2ff", anchor="center", padding=6)
-            header.grid(row=0, column=j, sticky="nsew", padx=1, pady=1)
-            header.bind("<Button-1>", lambda e, c=col: self.header_clicked(c))
-            vals = [str(x) for x in self.df[col]] if col in self.df.columns else [""]
-            width = max(12, min(36, max([len(str(col))]+[len(str(x)) for x in vals])))
-            header.config(width=width)
-            self.col_widths.append(width)
-        for i, (_, row) in enumerate(self.df.iterrows(), start=1):
-            for j, col in enumerate(self.columns):
-                val = row.get(col, "")
-                lbl = tk.Label(self.sheet_frame, text=str(val), bg="white", borderwidth=1, relief="solid", width=self.col_widths[j], anchor="w", padx=4)
-                lbl.grid(row=i, column=j, sticky="nsew", padx=1, pady=1)
-                # single-click select
-                lbl.bind("<Button-1>", lambda e, ii=i, jj=j: self._select_row(ii, jj))
-                # double-click edit (if editable)
-                if col != "__tabela":
-                    lbl.bind("<Double-1>", lambda e, rid=row.get("id", None), t=row.get("__tabela", None), c=col: self.cell_edit(e, rid, t, c))
-                self.entries[(i, j)] = lbl
-
-    def _select_row(self, i, j):
-        self.selected_row = (i, j)
-        for l in self.entries.values():
-            l.config(bg="white")
-        for jj in range(len(self.columns)):
-            widget = self.entries.get((i, jj))
-            if widget:
-                widget.config(bg="#eef9ff")
+        for col in self.columns:
+            self.tree.heading(col, text=col, command=lambda c=col: self.header_clicked(c))
+        self._size_columns()
+        self._render_rows()
+
+    def _size_columns(self):
+        """Sets the column widths from the first WIDTH_SAMPLE rows; sorting keeps them."""
+        char_px = tkfont.nametofont("TkDefaultFont").measure("0")
+        sample = self.df.head(self.WIDTH_SAMPLE)
+        for col in self.columns:
+            longest = sample[col].astype(str).str.len().fillna(0).max() if col in sample.columns and len(sample) else 0
+            width = max(12, min(36, max(len(str(col)), int(longest))))
+            self.tree.column(col, width=width * char_px + 12, minwidth=40, stretch=False, anchor="w")
+
+    def _render_rows(self):
+        """Reloads every row of self.df into the Treeview and refreshes the footer."""
+        self.tree.configure(height=max(1, min(self.VISIBLE_ROWS, len(self.df))))
+        self._fill_rows()
+        self._compute_totals()
+        self.stats_label.configure(text=self._stats_text())
+
+    def _fill_rows(self):
+        """
+        Replaces the Treeview items with the rows of self.df. Only the first
+        INSERT_CHUNK rows are inserted now; the rest follow in after() callbacks
+        so a large table shows up at once and the UI stays responsive.
+        """
+        self._cancel_fill()
+        self.tree.delete(*self.tree.get_children())
+        # one object array for the shown columns; chunks index its rows directly
+        shown = self.df.reindex(columns=self.columns, fill_value="").to_numpy(dtype=object)
+        self._insert_chunk(enumerate(shown))
+
+    def _insert_chunk(self, rows):
+        self._fill_job = None
+        n = 0
+        for i, values in itertools.islice(rows, self.INSERT_CHUNK):
+            self.tree.insert("", "end", iid=str(i), values=[str(v) for v in values])
+            n += 1
+        if n == self.INSERT_CHUNK:
+            self._fill_job = self.after(1, self._insert_chunk, rows)
+
+    def _cancel_fill(self):
+        if self._fill_job is not None:
+            self.after_cancel(self._fill_job)
+            self._fill_job = None
+
+    def destroy(self):
+        self._cancel_fill()
+        super().destroy()
+
+    def _on_mousewheel(self, event):
+        # scroll the tree only; keeps the page canvas behind it from scrolling too
+        self.tree.yview_scroll(3 * int(-1*(event.delta/120)), "units")
+        return "break"
+
+    def _cell_double_click(self, event):
+        if self.tree.identify_region(event.x, event.y) != "cell":
+            return
+        item = self.tree.identify_row(event.y)
+        colid = self.tree.identify_column(event.x)
+        if not item or not colid:
+            return
+        col = self.columns[int(colid[1:]) - 1]
+        if col == "__tabela":
+            return
+        self.cell_edit(item, col)
+
+    def _on_select(self, event=None):
+        # selected_row keeps the 1-based position of the row in self.df
+        sel = self.tree.selection()
+        self.selected_row = (int(sel[0]) + 1, 0) if sel else None
 
     def header_clicked(self, col):
+        import numpy as np
         asc = self.sort_state.get(col, True)
         try:
             if col not in self.df.columns:
                 return
             try:
-                tmp = pd.to_numeric(self.df[col].astype(str).str.replace(",", "."), errors="coerce")
-                if tmp.notnull().sum() > 0:
-                    self.df["_tmp_sort"] = tmp
-                    self.df = self.df.sort_values("_tmp_sort", ascending=asc).drop(columns=["_tmp_sort"])
+                keys = to_numeric(self.df[col]).to_numpy(dtype=float, na_value=np.nan)
+                if not np.isnan(keys).all():
+                    # stable argsort on the numeric key; negating for descending keeps NaN last
+                    order = np.argsort(keys if asc else -keys, kind="stable")
+                    self.df = self.df.iloc[order].reset_index(drop=True)
                 else:
-                    self.df = self.df.sort_values(col, ascending=asc)
+                    self.df = self.df.sort_values(col, ascending=asc, kind="mergesort")
             except Exception:
-                self.df = self.df.sort_values(col, ascending=asc)
+                self.df = self.df.sort_values(col, ascending=asc, kind="mergesort")
             self.sort_state[col] = not asc
-            self.build_table()
+            self._render_rows()
         except Exception as e:
             print("Erro ao ordenar:", e)
 
@@ -1768,8 +2381,34 @@ class SheetFrame(ttk.Frame):
                 return False, f"Valor não permitido. Escolha entre: {', '.join(allowed)}", None
         return True, "", value
 
-    def cell_edit(self, event, rowid, tablename, col):
-        oldval = event.widget.cget("text")
+    def update_single_cell(self, item, col, value):
+        """
+        Shows an edited value without reloading the sheet: sets the one Treeview
+        cell and self.df entry, and moves the footer sums by the change.
+        """
+        i = int(item)
+        j = self.df.columns.get_loc(col)
+        old = self.df.iat[i, j]
+        try:
+            self.df.iat[i, j] = value
+        except (TypeError, ValueError):
+            # typed/categorical column that cannot hold the new text
+            self.df[col] = self.df[col].astype(object)
+            self.df.iat[i, j] = value
+        self.tree.set(item, col, str(value))
+        if col in self._totals:
+            self._totals[col] += _cell_number(value) - _cell_number(old)
+        text = self._stats_text()
+        self.stats_label.configure(text=text)
+        if self.gui._sums_label is not None:
+            self.gui._sums_label.configure(text=text)
+
+    def cell_edit(self, item, col):
+        pd = _get_pd()
+        row = self.df.iloc[int(item)]
+        rowid = row.get("id", None)
+        tablename = row.get("__tabela", None)
+        oldval = self.tree.set(item, col)
         std = config.get_col_standardization(tablename, col)
         top = tk.Toplevel(self)
         top.title(f"Editar {col}")
@@ -1792,7 +2431,7 @@ class SheetFrame(ttk.Frame):
                     return
                 try:
                     update_cell(tablename, col, norm, rowid)
-                    self.gui.update_table_display()
+                    self.update_single_cell(item, col, norm)
                     top.destroy()
                 except Exception as e:
                     messagebox.showerror("Erro", f"Falha ao salvar: {e}")
@@ -1814,7 +2453,7 @@ class SheetFrame(ttk.Frame):
                     return
                 try:
                     update_cell(tablename, col, norm, rowid)
-                    self.gui.update_table_display()
+                    self.update_single_cell(item, col, norm)
                     top.destroy()
                 except Exception as e:
                     messagebox.showerror("Erro", f"Falha ao salvar: {e}")
@@ -1902,6 +2541,7 @@ class SheetFrame(ttk.Frame):
         ttk.Button(top, text="Salvar", command=save).grid(row=999, column=0, columnspan=2, pady=12)
 
     def delete_selection(self):
+        pd = _get_pd()
         if not self.selected_row:
             messagebox.showerror("Erro", "Selecione uma linha para excluir.")
             return
@@ -1924,6 +2564,7 @@ class SheetFrame(ttk.Frame):
                 messagebox.showerror("Erro", f"Falha ao excluir: {e}")
 
     def move_row_dialog(self):
+        pd = _get_pd()
         if not self.selected_row:
             messagebox.showerror("Erro", "Selecione uma linha para mover.")
             return
@@ -2029,9 +2670,21 @@ class SheetFrame(ttk.Frame):
         ttk.Button(top, text="Mover",  command=do_move).grid(row=4, column=0, columnspan=2, pady=10)
 
 # ----------------- Utilities -----------------
+def _cell_number(value):
+    """A single cell as a number the way to_numeric reads it; blanks/text count as 0."""
+    try:
+        num = float(str(value).replace(",", "."))
+    except ValueError:
+        return 0.0
+    return 0.0 if num != num else num
+
+# swaps the en-US separators for pt-BR ones ("1,234.56" -> "1.234,56") in one pass
+_PTBR_SEPARATORS = str.maketrans({",": ".", ".": ","})
+
+@functools.lru_cache(maxsize=256)
 def format_number(x):
     try:
-        return f"{float(x):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        return f"{float(x):,.2f}".translate(_PTBR_SEPARATORS)
     except Exception:
         return str(x)
 
@@ -2042,15 +2695,16 @@ if __name__ == "__main__":
 
     try:
         copy_db_backup()
-        mirror_db_to_excel_only_geral()
+        if config.mirror_excel:
+            mirror_db_to_excel_only_geral()
     except Exception as e:
         messagebox.showerror(
             "Erro ao iniciar",
             f"Ocorreu um erro ao preparar os dados:\n\n{e}"
         )
     try:
-        con = sqlite3.connect(DB_FILE)
-        con.close()
+        with _db_lock:
+            get_conn()
     except Exception:
         DB_FILE = DEFAULT_DB
     try:
@@ -2058,5 +2712,7 @@ if __name__ == "__main__":
         #mirror_db_to_excel()
     except Exception:
         pass
+    run_in_io_worker(analyze_db)
     app = FinanceManagerGUI()
     app.mainloop()
+    shutdown_io_worker()